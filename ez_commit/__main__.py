@@ -0,0 +1,18 @@
+"""
+Entry point for ez-commit
+"""
+
+import sys
+
+def main():
+    """Run ez-commit, answering ``ez-commit version`` without loading click."""
+    if sys.argv[1:] == ['version']:
+        from . import __version__
+        print(f"ez-commit version {__version__}")
+        return 0
+
+    from .cli import main as cli_main
+    return cli_main()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+On-disk cache of generated commit messages for ez-commit
+"""
+
+import os
+import json
+import platform
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Oldest entries beyond this many are removed when a new one is written
+MAX_ENTRIES = 256
+
+def get_cache_dir() -> Path:
+    """Get the directory holding cached responses based on the operating system."""
+    if platform.system() == "Windows":
+        base_dir = os.environ.get("LOCALAPPDATA") or os.environ.get("APPDATA")
+        if not base_dir:
+            raise ValueError("LOCALAPPDATA or APPDATA environment variable not found")
+        return Path(base_dir) / "ez-commit" / "responses"
+    else:
+        # Linux/Mac: Use XDG_CACHE_HOME or fallback to ~/.cache
+        base_dir = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+        return Path(base_dir) / "ez-commit" / "responses"
+
+def make_key(**request: Any) -> str:
+    """Hash everything that shapes a response into a cache key."""
+    import hashlib  # Only needed when a response may be cached
+    data = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached entry for ``key``, or None if there is none."""
+    try:
+        with open(get_cache_dir() / f"{key}.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def put(key: str, value: Dict[str, Any]) -> None:
+    """Store an entry atomically, dropping the oldest ones past MAX_ENTRIES."""
+    try:
+        cache_dir = get_cache_dir()
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_dir / f"{key}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp_file, cache_dir / f"{key}.json")
+        _prune(cache_dir)
+    except (OSError, TypeError, ValueError):
+        # The cache is only an optimization, never fail a command over it
+        pass
+
+def _prune(cache_dir: Path) -> None:
+    """Remove the least recently written entries past MAX_ENTRIES."""
+    entries = [e for e in os.scandir(cache_dir) if e.name.endswith(".json")]
+    if len(entries) <= MAX_ENTRIES:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime_ns)
+    for entry in entries[:len(entries) - MAX_ENTRIES]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
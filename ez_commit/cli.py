@@ -3,23 +3,41 @@ Command-line interface for ez-commit
 """
 
 import sys
+import functools
 import click
-from . import core
 from . import config as config_module
 from . import __version__
 from .ui import TerminalUI
 from .commands import EditorHandler, CommitHandler, ConfigHandler
-from .exceptions import EzCommitError, GitError, APIError, ConfigError
+from .exceptions import EzCommitError, GitError, APIError, ConfigError, ExitCodes
 
-def create_handlers():
-    """Create and return handlers with dependencies."""
+@functools.lru_cache(maxsize=None)
+def create_handlers(with_commit: bool = True):
+    """Create and return handlers with dependencies.
+
+    Config commands pass ``with_commit=False`` so that ``core`` (and with it
+    openai) is only imported when a commit is actually made.
+    The handlers are built once per process and shared by later callers.
+    """
     ui = TerminalUI()
     editor = EditorHandler()
-    commit_handler = CommitHandler(ui, core, editor)
+    commit_handler = None
+    if with_commit:
+        from . import core
+        commit_handler = CommitHandler(ui, core, editor)
     config_handler = ConfigHandler(config_module, editor)
     return ui, commit_handler, config_handler
 
-@click.group(invoke_without_command=True)
+@click.pass_context
+def _exit_with_code(ctx, code, **kwargs):
+    """Exit with the code the command returned.
+
+    Click drops command return values in standalone mode, so without this
+    every failure would exit 0.
+    """
+    ctx.exit(code or ExitCodes.SUCCESS)
+
+@click.group(invoke_without_command=True, result_callback=_exit_with_code)
 @click.pass_context
 @click.option('--preview', is_flag=True, help='Preview the commit message without committing')
 def main(ctx, preview):
@@ -33,24 +51,30 @@ def main(ctx, preview):
             if not success:
                 raise GitError(error)
 
+            if preview:
+                ui.display_message(commit_handler.current_message, "Generated Commit Message")
+                return ExitCodes.SUCCESS
+
             while True:
                 # Display interface
                 ui.display_message(commit_handler.current_message, "Generated Commit Message")
-                if preview:
-                    return 0
-
-                ui.display_actions()
-                choice = ui.get_user_choice()
+                has_next = commit_handler.has_alternatives
+                ui.display_actions(has_next)
+                choice = ui.get_user_choice(has_next)
 
                 if choice == 'c':
                     ui.display_info("\nCommit cancelled.")
-                    return 1
+                    return ExitCodes.ERROR
                 
                 elif choice == 'e':
                     ui.display_info("\nOpening editor...")
                     commit_handler.handle_edit()
                     continue
                 
+                elif choice == 'n':
+                    commit_handler.handle_next()
+                    continue
+                
                 elif choice == 'i':
                     success, error = commit_handler.handle_interactive()
                     if not success:
@@ -63,146 +87,99 @@ def main(ctx, preview):
                     if not success:
                         raise GitError(error)
                     ui.display_success("Changes committed successfully!")
-                    return 0
+                    return ExitCodes.SUCCESS
 
         except EzCommitError as e:
             ui.display_error(str(e))
             return e.exit_code
         except Exception as e:
             ui.display_error(str(e))
-            return 1
+            return ExitCodes.ERROR
+        finally:
+            # Cancelling, failing or Ctrl-C shouldn't wait on background git work
+            commit_handler.close()
 
 @main.command()
 def version():
     """Display the current version of ez-commit."""
     ui = TerminalUI()
     ui.display_info(f"ez-commit version {__version__}")
-    return 0
-
-@main.group()
-def config():
-    """Manage ez-commit configuration."""
-    pass
+    return ExitCodes.SUCCESS
 
-@config.command()
-def edit():
-    """Open the configuration file in your default editor."""
-    ui, _, config_handler = create_handlers()
+def _run_config_command(method_name, *args, success_message=None, pass_ui=False):
+    """Run a ConfigHandler method and report its outcome to the user."""
+    ui, _, config_handler = create_handlers(with_commit=False)
     try:
-        success, error = config_handler.edit_config()
+        if pass_ui:
+            args = (ui,) + args
+        success, error = getattr(config_handler, method_name)(*args)
         if not success:
             raise ConfigError(error)
-        return 0
+        if success_message:
+            ui.display_success(success_message)
+        return ExitCodes.SUCCESS
     except EzCommitError as e:
         ui.display_error(str(e))
         return e.exit_code
     except Exception as e:
         ui.display_error(str(e))
-        return 1
+        return ExitCodes.ERROR
+
+@main.group(result_callback=_exit_with_code)
+def config():
+    """Manage ez-commit configuration."""
+    pass
+
+@config.command()
+def edit():
+    """Open the configuration file in your default editor."""
+    return _run_config_command('edit_config')
 
 @config.command()
 def reset():
     """Reset configuration to default values."""
-    ui, _, config_handler = create_handlers()
-    try:
-        success, error = config_handler.reset_config(ui)
-        if not success:
-            raise ConfigError(error)
-        return 0
-    except EzCommitError as e:
-        ui.display_error(str(e))
-        return e.exit_code
-    except Exception as e:
-        ui.display_error(str(e))
-        return 1
+    return _run_config_command('reset_config', pass_ui=True)
 
 @config.command()
 @click.argument('key')
 def set_api_key(key):
     """Set the OpenAI API key."""
-    ui, _, config_handler = create_handlers()
-    try:
-        success, error = config_handler.set_api_key(key)
-        if not success:
-            raise ConfigError(error)
-        ui.display_success("API key updated successfully!")
-        return 0
-    except EzCommitError as e:
-        ui.display_error(str(e))
-        return e.exit_code
-    except Exception as e:
-        ui.display_error(str(e))
-        return 1
+    return _run_config_command('set_api_key', key, success_message="API key updated successfully!")
 
 @config.command()
 @click.argument('model')
 def set_model(model):
     """Set the OpenAI model (e.g., gpt-4, gpt-3.5-turbo)."""
-    ui, _, config_handler = create_handlers()
-    try:
-        success, error = config_handler.set_model(model)
-        if not success:
-            raise ConfigError(error)
-        ui.display_success(f"Model updated to: {model}")
-        return 0
-    except EzCommitError as e:
-        ui.display_error(str(e))
-        return e.exit_code
-    except Exception as e:
-        ui.display_error(str(e))
-        return 1
+    return _run_config_command('set_model', model, success_message=f"Model updated to: {model}")
 
 @config.command()
 @click.argument('temperature', type=float)
 def set_temperature(temperature):
     """Set the temperature (0.0 to 1.0) for response generation."""
-    ui, _, config_handler = create_handlers()
-    try:
-        success, error = config_handler.set_temperature(temperature)
-        if not success:
-            raise ConfigError(error)
-        ui.display_success(f"Temperature updated to: {temperature}")
-        return 0
-    except EzCommitError as e:
-        ui.display_error(str(e))
-        return e.exit_code
-    except Exception as e:
-        ui.display_error(str(e))
-        return 1
+    return _run_config_command('set_temperature', temperature,
+                               success_message=f"Temperature updated to: {temperature}")
 
 @config.command()
 def edit_prompt():
     """Edit the system prompt in your default editor."""
-    ui, _, config_handler = create_handlers()
-    try:
-        success, error = config_handler.edit_prompt()
-        if not success:
-            raise ConfigError(error)
-        ui.display_success("System prompt updated successfully!")
-        return 0
-    except EzCommitError as e:
-        ui.display_error(str(e))
-        return e.exit_code
-    except Exception as e:
-        ui.display_error(str(e))
-        return 1
+    return _run_config_command('edit_prompt', success_message="System prompt updated successfully!")
 
 @config.command()
 def show():
     """Show current configuration (excluding API key)."""
-    ui, _, config_handler = create_handlers()
+    ui, _, config_handler = create_handlers(with_commit=False)
     try:
         config, error = config_handler.show_config()
         if error:
             raise ConfigError(error)
         ui.display_config(config)
-        return 0
+        return ExitCodes.SUCCESS
     except EzCommitError as e:
         ui.display_error(str(e))
         return e.exit_code
     except Exception as e:
         ui.display_error(str(e))
-        return 1
+        return ExitCodes.ERROR
 
 if __name__ == '__main__':
     sys.exit(main())
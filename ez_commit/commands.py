@@ -3,16 +3,42 @@ Command handlers for ez-commit
 """
 
 import os
+import atexit
+import shlex
+import shutil
+import signal
 import subprocess
-import tempfile
+from pathlib import Path
 from typing import Optional, Tuple
 from .exceptions import GitError, APIError, ConfigError, EditorError
 
+# Longest first line accepted for a commit message
+MAX_SUBJECT_LENGTH = 50
+
 class EditorHandler:
     """Handles editor-related operations."""
     
     def __init__(self):
         self.editor = os.environ.get('EDITOR', 'vim')
+        self._editor_args = None
+        self._buffer_file = None
+
+    def _get_editor_args(self) -> list:
+        """Split $EDITOR (e.g. "code --wait") into argv once and reuse it.
+
+        An unquoted path with spaces in it, such as
+        "/Applications/My Editor.app/Contents/MacOS/editor", is kept whole
+        when its first word isn't a command but the whole value is.
+        """
+        if self._editor_args is None:
+            try:
+                args = shlex.split(self.editor)
+            except ValueError:  # e.g. an unbalanced quote in a path
+                args = [self.editor]
+            if args and shutil.which(args[0]) is None and shutil.which(self.editor) is not None:
+                args = [self.editor]
+            self._editor_args = args or ['vim']
+        return self._editor_args
 
     def open_editor(self, filename: str) -> None:
         """Open the editor with the given file."""
@@ -20,36 +46,71 @@ class EditorHandler:
             if os.name == 'nt':  # Windows
                 subprocess.run(['notepad', filename], check=True)
             else:
-                subprocess.run([self.editor, filename], check=True)
-        except subprocess.SubprocessError as e:
+                self._spawn_editor([*self._get_editor_args(), filename])
+        except (subprocess.SubprocessError, OSError) as e:
             raise EditorError(f"could not open editor: {str(e)}")
 
+    def _spawn_editor(self, args) -> None:
+        """Run the editor and wait for it, raising CalledProcessError if it fails.
+
+        Uses posix_spawn where available, avoiding fork's page-table copy.
+        """
+        if not hasattr(os, 'posix_spawnp'):
+            subprocess.run(args, check=True)
+            return
+        
+        pid = os.posix_spawnp(args[0], args, os.environ)
+        try:
+            _, status = os.waitpid(pid, 0)
+        except BaseException:
+            # Don't leave the editor running on the terminal if we are interrupted
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            raise
+        
+        if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+            raise subprocess.CalledProcessError(
+                os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status), args
+            )
+
+    def _get_buffer_file(self) -> str:
+        """Get the temp file reused for every edit, creating it on first use."""
+        if self._buffer_file is None:
+            import tempfile
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as tf:
+                self._buffer_file = tf.name
+            atexit.register(self._remove_buffer_file)
+        return self._buffer_file
+
+    def _remove_buffer_file(self) -> None:
+        """Remove the reusable temp file if it exists."""
+        filename, self._buffer_file = self._buffer_file, None
+        try:
+            if filename and os.path.exists(filename):
+                os.unlink(filename)
+        except OSError:
+            pass
+
     def edit_text(self, initial_text: str = "") -> str:
         """Edit text in a temporary file."""
-        filename = None
         try:
-            # Use UTF-8 encoding explicitly
-            with tempfile.NamedTemporaryFile(mode='w+', suffix='.txt', delete=False, encoding='utf-8') as tf:
-                tf.write(initial_text)
-                tf.flush()
-                filename = tf.name
+            filename = self._get_buffer_file()
+
+            # Encode up front and write in a single call, replacing the previous
+            # edit; line endings are translated the way text mode would
+            Path(filename).write_bytes(initial_text.replace('\n', os.linesep).encode('utf-8'))
             
             self.open_editor(filename)
             
-            # Read with UTF-8 encoding
-            with open(filename, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # Read the whole file in one go and decode as UTF-8, normalizing
+            # Windows line endings the way text mode would
+            content = Path(filename).read_bytes().decode('utf-8').replace('\r\n', '\n')
             
             return content.strip()
-        except (IOError, OSError) as e:
+        except (IOError, OSError, UnicodeDecodeError) as e:
+            # Start from a fresh temp file on the next edit
+            self._remove_buffer_file()
             raise EditorError(f"file operation failed: {str(e)}")
-        finally:
-            # Ensure temp file is cleaned up even if an error occurs
-            try:
-                if filename and os.path.exists(filename):
-                    os.unlink(filename)
-            except:
-                pass
 
 class CommitHandler:
     """Handles commit-related operations."""
@@ -59,28 +120,49 @@ class CommitHandler:
         self.core = core
         self.editor = editor_handler
         self._diff = None
+        self._was_staged = None
         self._message = None
+        self._alternatives = []
+        self._prestage = None
 
     def validate_commit_message(self, message: str) -> bool:
         """Validate commit message format."""
-        if not message or not message.strip():
-            return False
-            
-        lines = message.splitlines()
-        if not lines:
+        if not message:
             return False
+        
+        # Only the first line matters, so don't split the whole message
+        newline = message.find('\n')
+        first_line = message if newline < 0 else message[:newline]
+        if first_line.endswith('\r'):
+            first_line = first_line[:-1]
             
         # First line should be under 50 chars and not empty
-        if len(lines[0]) > 50 or not lines[0].strip():
-            return False
-            
-        return True
+        return len(first_line) <= MAX_SUBJECT_LENGTH and bool(first_line.strip())
 
     def initialize(self) -> Tuple[bool, Optional[str]]:
         """Initialize the commit process."""
         try:
-            self._diff = self.core.get_git_diff()
-            self._message = self.core.generate_commit_message(self._diff)
+            self._diff, self._was_staged = self.core.get_git_diff()
+            # Only once there is something to commit, build the OpenAI client
+            # in the background; there's no connection to open if the
+            # response cache has the answer
+            if not self.core.has_cached_response(self._diff):
+                self.core.prewarm_openai_client()
+            
+            # Unstaged changes get added at commit time; write their objects
+            # while we wait for the API so that step has less to do
+            if not self._was_staged:
+                self._prestage = self.core.prestage_changes()
+            # Show the message while it streams in; a first line that is
+            # already too long stops the request early
+            if self.ui.streams:
+                self.ui.display_stream_header("Generating Commit Message")
+            alternatives = []
+            message = self.core.generate_commit_message(
+                self._diff, on_text=self._on_text(), max_first_line=MAX_SUBJECT_LENGTH,
+                alternatives=alternatives
+            )
+            self._message = self._use_candidates(message, alternatives)
             
             if not self.validate_commit_message(self._message):
                 return False, "invalid commit message format"
@@ -93,6 +175,31 @@ class CommitHandler:
                 raise GitError(str(e))
             raise GitError("could not generate commit message")
 
+    def _on_text(self):
+        """Get the callback showing streamed text, or None if the UI doesn't stream.
+
+        The finished message is shown as a panel either way, so streaming to
+        a pipe or file would write it twice.
+        """
+        return self.ui.display_partial if self.ui.streams else None
+
+    def _use_candidates(self, message: str, alternatives: list) -> str:
+        """Keep the valid alternative candidates and pick the message to show.
+
+        Falls back to the first valid alternative when ``message`` itself is
+        invalid.
+        """
+        self._alternatives = [m for m in alternatives if self.validate_commit_message(m)]
+        if not self.validate_commit_message(message) and self._alternatives:
+            return self._alternatives.pop(0)
+        return message
+
+    def handle_next(self) -> None:
+        """Switch to the next candidate message, keeping the current one in rotation."""
+        if self._alternatives:
+            self._alternatives.append(self._message)
+            self._message = self._alternatives.pop(0)
+
     def handle_edit(self) -> None:
         """Handle edit action."""
         edited_message = self.editor.edit_text(self._message)
@@ -113,7 +220,15 @@ class CommitHandler:
                 {"role": "assistant", "content": self._message},
                 {"role": "user", "content": f"Suggested changes: {feedback}"}
             ]
-            new_message = self.core.generate_commit_message(self._diff, additional_messages)
+            if self.ui.streams:
+                self.ui.display_stream_header("Generating Commit Message")
+            alternatives = []
+            new_message = self.core.generate_commit_message(
+                self._diff, additional_messages,
+                on_text=self._on_text(), max_first_line=MAX_SUBJECT_LENGTH,
+                alternatives=alternatives
+            )
+            new_message = self._use_candidates(new_message, alternatives)
             
             if not self.validate_commit_message(new_message):
                 return False, "invalid commit message format"
@@ -130,17 +245,31 @@ class CommitHandler:
         try:
             if not self.validate_commit_message(self._message):
                 return False, "invalid commit message format"
-                
-            self.core.commit_changes(self._message)
+            
+            if self._prestage is not None:
+                self.core.finish_prestage(self._prestage)
+                self._prestage = None
+            self.core.commit_changes(self._message, self._was_staged)
             return True, None
         except Exception as e:
             raise GitError(f"could not commit changes: {str(e)}")
 
+    def close(self) -> None:
+        """Stop any background work the commit process still has running."""
+        if self._prestage is not None:
+            self.core.finish_prestage(self._prestage, cancel=True)
+            self._prestage = None
+
     @property
     def current_message(self) -> str:
         """Get the current commit message."""
         return self._message
 
+    @property
+    def has_alternatives(self) -> bool:
+        """Whether there are other candidate messages to switch to."""
+        return bool(self._alternatives)
+
 class ConfigHandler:
     """Handles configuration operations."""
     
@@ -192,8 +321,10 @@ class ConfigHandler:
         try:
             self.config.ensure_config_exists()
             cfg = self.config.load_config()
-            cfg["openai"]["api_key"] = key.strip()
-            self.config.save_config(cfg)
+            # Skip the write when the value is unchanged
+            if cfg["openai"]["api_key"] != key.strip():
+                cfg["openai"]["api_key"] = key.strip()
+                self.config.save_config(cfg)
             return True, None
         except Exception as e:
             raise ConfigError(f"could not save API key: {str(e)}")
@@ -206,33 +337,35 @@ class ConfigHandler:
         try:
             self.config.ensure_config_exists()
             cfg = self.config.load_config()
-            cfg["openai"]["model"] = model.strip()
-            self.config.save_config(cfg)
+            # Skip the write when the value is unchanged
+            if cfg["openai"]["model"] != model.strip():
+                cfg["openai"]["model"] = model.strip()
+                self.config.save_config(cfg)
             return True, None
         except Exception as e:
             raise ConfigError(f"could not save model: {str(e)}")
 
     def set_temperature(self, temperature: float) -> Tuple[bool, Optional[str]]:
         """Set the temperature for response generation."""
+        # Validate the input before touching the config file at all
         try:
             # Convert to float to handle string inputs
             temp = float(temperature)
+        except (TypeError, ValueError):
+            return False, "temperature must be a valid number between 0.0 and 1.0"
             
-            # Validate range and format
-            if not (0 <= temp <= 1):
-                return False, "temperature must be between 0.0 and 1.0"
-                
-            # Check for scientific notation
-            if 'e' in str(temp).lower():
-                return False, "temperature must be a decimal number between 0.0 and 1.0"
-            
+        # Validate range
+        if not (0 <= temp <= 1):
+            return False, "temperature must be between 0.0 and 1.0"
+        
+        try:
             self.config.ensure_config_exists()
             cfg = self.config.load_config()
-            cfg["openai"]["temperature"] = temp
-            self.config.save_config(cfg)
+            # Skip the write when the value is unchanged
+            if cfg["openai"]["temperature"] != temp:
+                cfg["openai"]["temperature"] = temp
+                self.config.save_config(cfg)
             return True, None
-        except ValueError:
-            return False, "temperature must be a valid number between 0.0 and 1.0"
         except Exception as e:
             raise ConfigError(f"could not save temperature: {str(e)}")
 
@@ -245,8 +378,10 @@ class ConfigHandler:
             
             new_prompt = self.editor.edit_text(current_prompt)
             if new_prompt and new_prompt.strip():
-                cfg["system_prompt"] = new_prompt
-                self.config.save_config(cfg)
+                # Closing the editor without changes is not worth a write
+                if new_prompt != current_prompt.strip():
+                    cfg["system_prompt"] = new_prompt
+                    self.config.save_config(cfg)
                 return True, None
             return False, "system prompt cannot be empty"
         except Exception as e:
@@ -3,10 +3,11 @@ Configuration management for ez-commit
 """
 
 import os
-import yaml
+import json
+import copy
 from pathlib import Path
 import platform
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
 DEFAULT_SYSTEM_PROMPT = """You are a helpful assistant that generates clear and concise git commit messages.
 Follow these guidelines:
@@ -22,53 +23,80 @@ DEFAULT_CONFIG = {
         "api_key": "",
         "model": "gpt-4",
         "temperature": 0.7,
-        "max_tokens": 10000
+        "max_tokens": 10000,
+        "n_candidates": 1
+    },
+    "git": {
+        "max_diff_bytes": 1024 * 1024
+    },
+    # Only used at temperature 0 unless "sampled" is set, so with the
+    # default temperature the response cache is off
+    "cache": {
+        "enabled": True,
+        "sampled": False
     },
     "system_prompt": DEFAULT_SYSTEM_PROMPT
 }
 
-def deep_merge(source: Dict[str, Any], destination: Dict[str, Any]) -> Dict[str, Any]:
-    """Deep merge two dictionaries."""
-    for key, value in source.items():
-        if key in destination:
-            if isinstance(value, dict) and isinstance(destination[key], dict):
-                destination[key] = deep_merge(value, destination[key])
-            else:
-                destination[key] = value
-        else:
-            destination[key] = value
-    return destination
+def _yaml():
+    """Import PyYAML on first use, preferring the libyaml C bindings.
+
+    Loads served from the JSON cache never need PyYAML, so it is kept off
+    the import path of the module.
+    """
+    import yaml
+    try:
+        from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
+    except ImportError:
+        from yaml import SafeLoader as Loader, SafeDumper as Dumper
+    return yaml, Loader, Dumper
+
+# Required config keys as (path, expected type) pairs
+_SCHEMA = (
+    (("openai", "api_key"), str),
+    (("openai", "model"), str),
+    (("openai", "temperature"), (int, float)),
+    (("openai", "max_tokens"), int),
+    (("openai", "n_candidates"), int),
+    (("git", "max_diff_bytes"), int),
+    (("cache", "enabled"), bool),
+    (("cache", "sampled"), bool),
+    (("system_prompt",), str),
+)
+
+def merge_with_defaults(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Overlay a loaded configuration onto the defaults.
+
+    The schema is only two levels deep, so sections such as ``openai`` are
+    merged key by key and everything else is taken as-is from ``config``.
+    An empty section (``openai:`` with nothing under it) or a blank
+    ``system_prompt`` falls back to the default instead of failing validation.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("Invalid type for configuration: expected dict")
+    
+    merged = {**DEFAULT_CONFIG, **config}
+    for section, defaults in DEFAULT_CONFIG.items():
+        values = config.get(section) or {}
+        if isinstance(defaults, dict) and isinstance(values, dict):
+            merged[section] = {**defaults, **values}
+    merged["system_prompt"] = config.get("system_prompt") or DEFAULT_SYSTEM_PROMPT
+    return merged
 
 def validate_config_structure(config: Dict[str, Any]) -> None:
     """Validate the structure of the configuration."""
-    required_keys = {
-        "openai": {
-            "api_key": str,
-            "model": str,
-            "temperature": (int, float),
-            "max_tokens": int
-        },
-        "system_prompt": str
-    }
-
-    def validate_dict(config_dict: Dict[str, Any], required: Dict[str, Any], path: str = "") -> None:
-        for key, value_type in required.items():
-            if key not in config_dict:
-                raise ValueError(f"Missing required configuration key: {path + key}")
-            
-            if isinstance(value_type, dict):
-                if not isinstance(config_dict[key], dict):
-                    raise ValueError(f"Invalid type for {path + key}: expected dict")
-                validate_dict(config_dict[key], value_type, f"{path + key}.")
-            else:
-                if isinstance(value_type, tuple):
-                    if not isinstance(config_dict[key], value_type):
-                        raise ValueError(f"Invalid type for {path + key}: expected {value_type}")
-                else:
-                    if not isinstance(config_dict[key], value_type):
-                        raise ValueError(f"Invalid type for {path + key}: expected {value_type.__name__}")
-
-    validate_dict(config, required_keys)
+    for path, value_type in _SCHEMA:
+        value = config
+        for depth, key in enumerate(path):
+            if key not in value:
+                raise ValueError(f"Missing required configuration key: {'.'.join(path[:depth + 1])}")
+            value = value[key]
+            if depth < len(path) - 1 and not isinstance(value, dict):
+                raise ValueError(f"Invalid type for {'.'.join(path[:depth + 1])}: expected dict")
+        
+        if not isinstance(value, value_type):
+            expected = value_type if isinstance(value_type, tuple) else value_type.__name__
+            raise ValueError(f"Invalid type for {'.'.join(path)}: expected {expected}")
 
     # Additional validation for specific values
     temp = config["openai"]["temperature"]
@@ -79,6 +107,14 @@ def validate_config_structure(config: Dict[str, Any]) -> None:
     if not (isinstance(max_tokens, int) and max_tokens > 0):
         raise ValueError("max_tokens must be a positive integer")
 
+    n_candidates = config["openai"]["n_candidates"]
+    if not (isinstance(n_candidates, int) and n_candidates > 0):
+        raise ValueError("n_candidates must be a positive integer")
+
+    max_diff_bytes = config["git"]["max_diff_bytes"]
+    if not (isinstance(max_diff_bytes, int) and max_diff_bytes > 0):
+        raise ValueError("max_diff_bytes must be a positive integer")
+
 def get_config_dir() -> Path:
     """Get the appropriate config directory based on the operating system."""
     if platform.system() == "Windows":
@@ -96,49 +132,108 @@ def get_config_file() -> Path:
     config_dir = get_config_dir()
     return config_dir / "config.yaml"
 
+def get_cache_file() -> Path:
+    """Get the path to the parsed config cache file."""
+    config_dir = get_config_dir()
+    return config_dir / "config.cache.json"
+
+def _config_version(config_file: Path) -> str:
+    """Get a version key for the config file based on its mtime and size."""
+    st = config_file.stat()
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _read_config_cache(version: str) -> Optional[Dict[str, Any]]:
+    """Return the cached config if it was written for the given YAML version."""
+    try:
+        with open(get_cache_file(), 'r', encoding='utf-8') as f:
+            # First line holds the version of the YAML file the cache was built from
+            if f.readline().strip() != version:
+                return None
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+def _write_config_cache(version: str, config: Dict[str, Any]) -> None:
+    """Write the parsed config to the cache file atomically."""
+    cache_file = get_cache_file()
+    tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(f"{version}\n")
+            f.write(json.dumps(config))
+        os.replace(tmp_file, cache_file)
+    except (OSError, TypeError, ValueError):
+        # The cache is only an optimization, never fail a command over it
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
+
+# (SHA-256 of the YAML text, file version) of the last config this process wrote
+_last_saved = None
+
+# Merged config from the last load, keyed by the config file version
+_CACHE = {'version': None, 'data': None}
+
 def ensure_config_exists():
     """Create default config file if it doesn't exist."""
     config_file = get_config_file()
     if not config_file.exists():
         config_file.parent.mkdir(parents=True, exist_ok=True)
-        save_config(DEFAULT_CONFIG)
+        _save_default_config()
+
+def invalidate_config_cache() -> None:
+    """Drop the in-process config cache so the next load re-reads the file."""
+    _CACHE['version'] = None
+    _CACHE['data'] = None
 
 def reset_config() -> bool:
     """Reset configuration to default values."""
+    invalidate_config_cache()
     try:
-        save_config(DEFAULT_CONFIG)
+        _save_default_config()
         return True
     except Exception:
         return False
 
 def load_config() -> dict:
-    """Load configuration from file."""
+    """Load configuration from file.
+
+    Repeated loads of an unchanged file are served from an in-process cache.
+    Callers get their own deep copy and may modify it freely.
+    """
     ensure_config_exists()
     config_file = get_config_file()
     
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            try:
-                config = yaml.safe_load(f) or {}
-            except yaml.YAMLError as e:
-                raise ValueError(f"Invalid YAML in config file: {str(e)}")
+        version = _config_version(config_file)
+        if _CACHE['version'] == version:
+            return copy.deepcopy(_CACHE['data'])
+        
+        config = _read_config_cache(version)
+        if config is None:
+            yaml, loader, _ = _yaml()
+            with open(config_file, 'r', encoding='utf-8') as f:
+                try:
+                    config = yaml.load(f, Loader=loader) or {}
+                except yaml.YAMLError as e:
+                    raise ValueError(f"Invalid YAML in config file: {str(e)}")
+            _write_config_cache(version, config)
     except Exception as e:
         raise ValueError(f"Error reading config file: {str(e)}")
     
-    # Deep merge with defaults to ensure all fields exist
-    merged_config = DEFAULT_CONFIG.copy()
-    if config:
-        merged_config = deep_merge(config, merged_config)
-    
-    # Validate the merged configuration
+    # Merge with defaults to ensure all fields exist, then validate the result
     try:
+        merged_config = merge_with_defaults(config)
         validate_config_structure(merged_config)
     except ValueError as e:
         # If validation fails, reset to defaults
-        save_config(DEFAULT_CONFIG)
+        _save_default_config()
         raise ValueError(f"Invalid configuration detected, reset to defaults: {str(e)}")
     
-    return merged_config
+    _CACHE['version'] = version
+    _CACHE['data'] = merged_config
+    return copy.deepcopy(merged_config)
 
 def save_config(config: dict):
     """Save configuration to file."""
@@ -148,32 +243,82 @@ def save_config(config: dict):
     except ValueError as e:
         raise ValueError(f"Invalid configuration: {str(e)}")
     
+    _write_config(config, _dump_config(config))
+
+def _dump_config(config: dict) -> str:
+    """Serialize a configuration to YAML."""
+    try:
+        yaml, _, dumper = _yaml()
+        return yaml.dump(config, Dumper=dumper, default_flow_style=False)
+    except Exception as e:
+        raise ValueError(f"Error saving config file: {str(e)}")
+
+_default_config_yaml = None
+
+def _save_default_config():
+    """Write the default configuration, serializing it at most once per process."""
+    global _default_config_yaml
+    if _default_config_yaml is None:
+        _default_config_yaml = _dump_config(DEFAULT_CONFIG)
+    _write_config(DEFAULT_CONFIG, _default_config_yaml)
+
+def _write_config(config: dict, content: str):
+    """Write already serialized configuration to the config file."""
+    global _last_saved
+    import hashlib  # Only needed on writes, which most commands never do
+    
     config_file = get_config_file()
     config_file.parent.mkdir(parents=True, exist_ok=True)
+    data = content.encode('utf-8')
+    digest = hashlib.sha256(data).digest()
+    
+    # Skip the write if this process already wrote the same bytes and the
+    # file has not been touched since
+    if (_last_saved is not None and _last_saved[0] == digest
+            and config_file.exists() and _last_saved[1] == _config_version(config_file)):
+        return
     
+    # Write to a temp file and swap it in so a crash never leaves a partial config
+    tmp_file = config_file.with_name(config_file.name + ".tmp")
     try:
-        with open(config_file, 'w', encoding='utf-8') as f:
-            yaml.safe_dump(config, f, default_flow_style=False)
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            # Make sure the data is on disk before the rename makes it visible
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, config_file)
     except Exception as e:
+        # The old config is still in place; just drop the partial copy
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
         raise ValueError(f"Error saving config file: {str(e)}")
+    
+    # Refresh the cache so the next load skips YAML parsing
+    version = _config_version(config_file)
+    _last_saved = (digest, version)
+    _write_config_cache(version, config)
+    invalidate_config_cache()
 
-def get_openai_api_key() -> str:
+def get_openai_api_key(config: Optional[Dict[str, Any]] = None) -> str:
     """Get OpenAI API key from config or environment variable."""
     env_key = os.environ.get("OPENAI_API_KEY")
     if env_key and env_key.strip():
         return env_key.strip()
     
-    config = load_config()
+    if config is None:
+        config = load_config()
     config_key = config["openai"]["api_key"]
     if config_key and config_key.strip():
         return config_key.strip()
     
     return ""
 
-def validate_config():
-    """Validate that the configuration is valid and complete."""
+def load_validated() -> Tuple[Dict[str, Any], str]:
+    """Load the configuration and the API key, ensuring a key is available."""
     config = load_config()
-    api_key = get_openai_api_key()
+    api_key = get_openai_api_key(config)
     
     if not api_key:
         raise ValueError(
@@ -181,4 +326,9 @@ def validate_config():
             "or set the OPENAI_API_KEY environment variable."
         )
     
+    return config, api_key
+
+def validate_config():
+    """Validate that the configuration is valid and complete."""
+    config, _ = load_validated()
     return config
@@ -1,104 +1,516 @@
 """
 Core functionality for ez-commit
+
+git is run directly as a subprocess and openai is imported inside the
+functions that use it, so importing this module stays cheap.
 """
 
-import git
-from openai import OpenAI
-from . import config
+import os
+import shutil
+import functools
+import subprocess
+import tempfile
+import threading
+import uuid
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple
+from . import cache, config
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+# Diffs are read from git in chunks of this many bytes
+DIFF_CHUNK_SIZE = 64 * 1024
+
+def _git_error(stderr: str) -> ValueError:
+    """Turn git's error output into the ValueError raised to callers."""
+    message = stderr.strip()
+    if "not a git repository" in message.lower():
+        return ValueError("Not a git repository")
+    if "binary files differ" in message.lower():
+        return ValueError("Binary files detected in diff. Please stage only text files.")
+    # git puts the actual error on the first line, usage text may follow
+    return ValueError(f"Git error: {message.splitlines()[0] if message else 'unknown error'}")
+
+# (top-level directory, .git directory) of the repository, by the working
+# directory it was looked up from, shared by the diff and commit steps
+_repo_cache = {}
+
+def _lookup_repo() -> Tuple[str, str]:
+    """Find the current repository's directories once per working directory."""
+    cwd = os.getcwd()
+    repo = _repo_cache.get(cwd)
+    if repo is None:
+        try:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--show-toplevel', '--absolute-git-dir'],
+                capture_output=True, text=True
+            )
+        except OSError as e:
+            raise ValueError(f"Git error: {str(e)}")
+        if result.returncode != 0:
+            raise _git_error(result.stderr)
+        repo = _repo_cache[cwd] = tuple(result.stdout.splitlines()[:2])
+    return repo
 
-def get_git_diff() -> str:
-    """Get the current git diff."""
+def _get_repo() -> str:
+    """Get the top-level directory of the current repository."""
+    return _lookup_repo()[0]
+
+def _get_git_dir() -> str:
+    """Get the .git directory of the current repository."""
+    return _lookup_repo()[1]
+
+def reset_repo() -> None:
+    """Forget the cached repositories so the next call looks them up again."""
+    _repo_cache.clear()
+
+def _run_git(*args, input: str = None) -> subprocess.CompletedProcess:
+    """Run a git command in the repository, raising ValueError if it fails."""
+    repo = _get_repo()
     try:
-        repo = git.Repo(search_parent_directories=True)
-        
-        # Get staged changes first
-        staged_diff = repo.git.diff('--cached', '--text')  # Force text output
-        
-        # If nothing is staged, get unstaged changes
-        if not staged_diff:
-            diff = repo.git.diff('--text')  # Force text output
-            if not diff:
-                raise ValueError("No changes detected (staged or unstaged)")
-            return diff
-        
-        return staged_diff
+        result = subprocess.run(
+            ['git', *args], capture_output=True, cwd=repo, input=input,
+            encoding='utf-8', errors='replace'
+        )
+    except OSError as e:
+        raise ValueError(f"Git error: {str(e)}")
+    
+    if result.returncode != 0:
+        raise _git_error(result.stderr)
+    return result
+
+def _has_staged_changes() -> bool:
+    """Check whether anything is staged, without reading the diff itself."""
+    repo = _get_repo()
+    try:
+        result = subprocess.run(['git', 'diff', '--cached', '--quiet'], capture_output=True, text=True, cwd=repo)
+    except OSError as e:
+        raise ValueError(f"Git error: {str(e)}")
     
-    except git.InvalidGitRepositoryError:
-        raise ValueError("Not a git repository")
-    except git.GitCommandError as e:
-        if "binary files differ" in str(e).lower():
-            raise ValueError("Binary files detected in diff. Please stage only text files.")
+    # --quiet exits with 1 when there are differences
+    if result.returncode > 1:
+        raise _git_error(result.stderr)
+    return result.returncode == 1
+
+def _iter_git_diff(*args):
+    """Yield chunks of ``git diff`` output as git produces them."""
+    repo = _get_repo()
+    # stderr goes to a file rather than a pipe: nothing reads it until the
+    # diff is done, and a full pipe would leave git blocked on it
+    errors = tempfile.TemporaryFile()
+    try:
+        proc = subprocess.Popen(['git', 'diff', *args], stdout=subprocess.PIPE, stderr=errors, cwd=repo)
+    except OSError as e:
+        errors.close()
         raise ValueError(f"Git error: {str(e)}")
+    
+    try:
+        while True:
+            chunk = proc.stdout.read1(DIFF_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        
+        if proc.wait() != 0:
+            errors.seek(0)
+            raise _git_error(errors.read().decode('utf-8', errors='replace'))
+    finally:
+        # Stop git if the reader gave up before the end of the diff
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        errors.close()
+
+def _read_capped(max_bytes: int, *args) -> Tuple[bytes, bool]:
+    """Read ``git diff`` output, stopping once ``max_bytes`` have been read.
+
+    Returns at most ``max_bytes`` of output and whether there was more.
+    """
+    chunks = []
+    size = 0
+    truncated = False
+    stream = _iter_git_diff(*args)
+    for chunk in stream:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_bytes:
+            truncated = True
+            stream.close()
+            break
+    return b"".join(chunks)[:max_bytes], truncated
+
+def _cut_at_line(data: bytes, max_bytes: int) -> bytes:
+    """Cut ``data`` to at most ``max_bytes``, ending after a whole line.
+
+    A newline byte never occurs inside a UTF-8 sequence, so neither lines nor
+    characters are split.
+    """
+    if len(data) <= max_bytes:
+        return data
+    return data[:data.rfind(b"\n", 0, max_bytes) + 1]
+
+# Appended to a diff that had to be cut down to fit the size cap
+_TRUNCATED_MARKER = b"\n[diff truncated]"
+
+def _read_git_diff(max_bytes: int, *args) -> str:
+    """Read ``git diff`` output, summarizing it if it is over ``max_bytes``.
+
+    A summarized diff, marker included, still fits in ``max_bytes``.
+    """
+    data, truncated = _read_capped(max_bytes, *args)
+    if truncated:
+        # Cutting the patch off would hide every file after the cut, so lead
+        # with a per-file summary, allowed the whole budget, and fill what is
+        # left with a tighter patch. A short graph keeps each file's line small
+        budget = max(max_bytes - len(_TRUNCATED_MARKER), 0)
+        stat = _cut_at_line(_read_capped(budget, '--stat', '--stat-graph-width=10', *args)[0], budget)
+        budget = max(budget - len(stat) - 1, 0)
+        patch = _cut_at_line(_read_capped(budget, '--unified=1', *args)[0], budget)
+        data = stat + b"\n" + patch
+    
+    diff = data.decode('utf-8', errors='replace').rstrip('\n')
+    if truncated:
+        diff += _TRUNCATED_MARKER.decode('ascii')
+    return diff
+
+def get_git_diff(max_bytes: int = None) -> Tuple[str, bool]:
+    """Get the current git diff, truncated to ``max_bytes``.
 
-# Create a single OpenAI client instance
+    Returns the diff and whether it came from staged changes. The limit
+    defaults to the ``git.max_diff_bytes`` config setting.
+    """
+    if max_bytes is None:
+        max_bytes = config.load_config()["git"]["max_diff_bytes"]
+    
+    # Get staged changes first
+    staged_diff = _read_git_diff(max_bytes, '--cached', '--text')  # Force text output
+    
+    # If nothing is staged, get unstaged changes
+    if not staged_diff:
+        diff = _read_git_diff(max_bytes, '--text')  # Force text output
+        if not diff:
+            raise ValueError("No changes detected (staged or unstaged)")
+        return diff, False
+    
+    return staged_diff, True
+
+def _scratch_index() -> str:
+    """Path of the scratch index that ``prestage_changes`` writes to."""
+    return os.path.join(_get_git_dir(), f'ez-commit-index.{os.getpid()}')
+
+def prestage_changes() -> Optional[subprocess.Popen]:
+    """Start writing the objects for unstaged changes without staging anything.
+
+    Starts ``git add --all`` against a scratch copy of the index, so the blobs
+    are already in the object store when the real ``git add`` runs at commit
+    time. The real index is untouched, so cancelling leaves the repository as
+    it was. Returns the running git process, to be handed to
+    ``finish_prestage``, or None if it couldn't be started. This is only an
+    optimization, so failures are ignored.
+    """
+    repo, git_dir = _lookup_repo()
+    index = os.path.join(git_dir, 'index')
+    scratch = _scratch_index()
+    try:
+        if os.path.exists(index):
+            shutil.copyfile(index, scratch)
+        return subprocess.Popen(
+            ['git', 'add', '--all'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            cwd=repo, env={**os.environ, 'GIT_INDEX_FILE': scratch}
+        )
+    except OSError:
+        finish_prestage(None)
+        return None
+
+def finish_prestage(proc: Optional[subprocess.Popen], cancel: bool = False) -> None:
+    """Wait for a ``prestage_changes`` process, or stop it if ``cancel`` is set,
+    then remove its scratch index.
+    """
+    try:
+        if proc is not None:
+            try:
+                if cancel and proc.poll() is None:
+                    proc.terminate()
+                proc.wait()
+            except BaseException:
+                # Interrupted while waiting; git mustn't outlive us and write
+                # the scratch index again after it is removed
+                proc.kill()
+                proc.wait()
+                raise
+    finally:
+        try:
+            os.unlink(_scratch_index())
+        except OSError:
+            pass
+
+# Create a single OpenAI client instance. Every generation in a session,
+# interactive retries included, goes through it and so reuses its connection
+# pool. The client stays synchronous: responses are streamed to the terminal,
+# so the wait already overlaps with rendering, and Ctrl-C closes the stream.
 _openai_client = None
+# The HTTP client behind it, kept for the warm-up request
+_http_client = None
+# Held while the client is built, which the warm-up thread may be doing
+_client_lock = threading.Lock()
+
+# Give up on a stalled stream after a minute instead of the SDK's ten
+OPENAI_TIMEOUT = (60.0, 5.0)  # (read/write, connect) seconds
+# Keep the connection through the time spent reading a message and typing
+# feedback; the SDK default of 5 seconds means a new TLS handshake per retry
+OPENAI_KEEPALIVE_EXPIRY = 120.0
+# Connection errors, rate limits and 5xx responses are retried by the SDK with
+# exponential backoff. Each call's Idempotency-Key is only a hint; nothing
+# guarantees a retry is not processed a second time
+OPENAI_MAX_RETRIES = 3
 
-def get_openai_client() -> OpenAI:
+def get_openai_client(api_key: str = None) -> "OpenAI":
     """Get or create OpenAI client instance."""
-    global _openai_client
-    if _openai_client is None:
-        _openai_client = OpenAI(api_key=config.get_openai_api_key())
+    with _client_lock:
+        if _openai_client is None:
+            _create_openai_client(api_key)
     return _openai_client
 
+def _create_openai_client(api_key: str = None) -> None:
+    """Build the shared OpenAI client and its HTTP client."""
+    global _openai_client, _http_client
+    import atexit
+    from openai import OpenAI, DefaultHttpxClient, DEFAULT_CONNECTION_LIMITS, Timeout
+    if api_key is None:
+        api_key = config.get_openai_api_key()
+    # Build the limits with the SDK's own HTTP library rather than
+    # importing it by name
+    limits = type(DEFAULT_CONNECTION_LIMITS)(
+        max_connections=4, max_keepalive_connections=2,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+    )
+    _http_client = DefaultHttpxClient(
+        timeout=Timeout(OPENAI_TIMEOUT[0], connect=OPENAI_TIMEOUT[1]),
+        limits=limits
+    )
+    _openai_client = OpenAI(api_key=api_key, http_client=_http_client,
+                            max_retries=OPENAI_MAX_RETRIES)
+    atexit.register(_openai_client.close)
+
+@functools.lru_cache(maxsize=1)
+def _settings() -> Tuple[dict, str]:
+    """Load and validate the config and API key once per process.
+
+    Config only changes through the config commands, which run in their own
+    process, so interactive retries reuse this. Call ``_settings.cache_clear()``
+    after changing the config in-process.
+    """
+    return config.load_validated()
+
+def prewarm_openai_client() -> None:
+    """Create the OpenAI client and open its connection ahead of the first request.
+
+    Returns straight away and does the work on a daemon thread, so nothing
+    waits for it. An unauthenticated HEAD is enough to get the TLS handshake
+    done while the prompt is prepared; the pooled connection is then reused
+    by the request.
+    """
+    # Loading the config isn't safe next to another load on the caller's
+    # thread, so only the thread that called us touches it
+    _, api_key = _settings()
+    
+    def warm_up():
+        client = get_openai_client(api_key)
+        if _http_client is None:
+            return
+        try:
+            _http_client.head(str(client.base_url.join("models")), timeout=OPENAI_TIMEOUT[1])
+        except Exception:
+            # Only a head start, the real request reports connection problems
+            pass
+    
+    threading.Thread(target=warm_up, name="ez-commit-prewarm", daemon=True).start()
+
 def create_commit_prompt(diff: str, system_prompt: str, additional_messages: list = None) -> list:
     """Create the messages list for the OpenAI API call."""
-    messages = [
+    # Plain string content, which every OpenAI-compatible endpoint accepts
+    return [
         {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"Generate a commit message for the following git diff:\n\n{diff}"}
+        {"role": "user", "content": f"Generate a commit message for the following git diff:\n\n{diff}"},
+        *(additional_messages or ()),
     ]
-    
-    if additional_messages:
-        messages.extend(additional_messages)
-    
-    return messages
 
-def generate_commit_message(diff: str = None, additional_messages: list = None) -> str:
-    """Generate a commit message using OpenAI API."""
+def _first_line_too_long(text: str, max_length: int) -> Tuple[bool, bool]:
+    """Check the first line of streamed text against ``max_length``.
+
+    Returns whether the line is already too long and whether it is complete.
+    """
+    text = text.lstrip()
+    newline = text.find('\n')
+    first_line = text if newline < 0 else text[:newline].rstrip('\r')
+    return len(first_line) > max_length, newline >= 0
+
+def stream_commit_message(diff: str = None, additional_messages: list = None,
+                          max_first_line: int = None, alternatives: list = None) -> Iterator[str]:
+    """Generate a commit message using OpenAI API, yielding text as it arrives.
+
+    If the first line grows past ``max_first_line`` characters the request is
+    cancelled after yielding the text that pushed it over. When the
+    ``openai.n_candidates`` setting asks for more than one candidate, only the
+    first is yielded and the others are appended to ``alternatives`` once the
+    stream ends; the request is then never cancelled early.
+    """
     if diff is None:
-        diff = get_git_diff()
+        diff, _ = get_git_diff()
     
-    cfg = config.validate_config()
-    client = get_openai_client()
+    cfg, api_key = _settings()
+    client = get_openai_client(api_key)
     
     messages = create_commit_prompt(diff, cfg["system_prompt"], additional_messages)
     
     try:
-        response = client.chat.completions.create(
+        stream = client.chat.completions.create(
             model=cfg["openai"]["model"],
             messages=messages,
             temperature=cfg["openai"]["temperature"],
-            max_tokens=cfg["openai"]["max_tokens"]
+            max_tokens=cfg["openai"]["max_tokens"],
+            n=cfg["openai"]["n_candidates"],
+            stream=True,
+            # Advisory only: chat completions does not document this header,
+            # but a server or proxy that honours it can drop retried requests.
+            # A fresh key per call, so asking again still gets a new message
+            extra_headers={"Idempotency-Key": f"ez-commit-{uuid.uuid4().hex}"}
         )
-        
-        commit_message = response.choices[0].message.content.strip()
-        if not commit_message:
-            raise ValueError("Generated commit message is empty")
-        
-        return commit_message
-    
     except Exception as e:
         raise ValueError(f"OpenAI API error: {str(e)}")
+    
+    # Cancelling would cut the other candidates short too
+    if cfg["openai"]["n_candidates"] > 1:
+        max_first_line = None
+    
+    received = ""
+    others = {}
+    try:
+        while True:
+            try:
+                chunk = next(stream, None)
+            except Exception as e:
+                raise ValueError(f"OpenAI API error: {str(e)}")
+            if chunk is None:
+                break
+            
+            text = None
+            for choice in chunk.choices:
+                if choice.index == 0:
+                    text = choice.delta.content
+                elif choice.delta.content:
+                    others.setdefault(choice.index, []).append(choice.delta.content)
+            if not text:
+                continue
+            yield text
+            
+            if max_first_line is not None:
+                received += text
+                too_long, complete = _first_line_too_long(received, max_first_line)
+                if too_long:
+                    break
+                if complete:
+                    max_first_line = None
+    finally:
+        # Drops the connection if we stopped before the end of the completion
+        stream.close()
+    
+    if alternatives is not None:
+        for index in sorted(others):
+            text = "".join(others[index]).strip()
+            if text:
+                alternatives.append(text)
+
+def _response_cache_key(cfg: dict, diff: str, additional_messages: list = None):
+    """Get the response cache key for a request, or None if it shouldn't be cached.
+
+    Sampled responses (temperature above 0) are only cached when the
+    ``cache.sampled`` setting opts in, since rerunning is how users ask for a
+    different message.
+    """
+    if not cfg["cache"]["enabled"]:
+        return None
+    if cfg["openai"]["temperature"] > 0 and not cfg["cache"]["sampled"]:
+        return None
+    return cache.make_key(
+        diff=diff,
+        system_prompt=cfg["system_prompt"],
+        model=cfg["openai"]["model"],
+        temperature=cfg["openai"]["temperature"],
+        max_tokens=cfg["openai"]["max_tokens"],
+        n=cfg["openai"]["n_candidates"],
+        additional_messages=additional_messages,
+    )
+
+def has_cached_response(diff: str, additional_messages: list = None) -> bool:
+    """Whether ``generate_commit_message`` would answer from the response cache."""
+    key = _response_cache_key(_settings()[0], diff, additional_messages)
+    return key is not None and cache.get(key) is not None
+
+def generate_commit_message(diff: str = None, additional_messages: list = None,
+                            on_text=None, max_first_line: int = None,
+                            alternatives: list = None) -> str:
+    """Generate a commit message using OpenAI API.
+
+    ``on_text`` is called with each piece of text as it streams in. See
+    ``stream_commit_message`` for ``max_first_line`` and ``alternatives``.
+    Identical requests are answered from the response cache when it applies.
+    """
+    if diff is None:
+        diff, _ = get_git_diff()
+    
+    key = _response_cache_key(_settings()[0], diff, additional_messages)
+    cached = cache.get(key) if key is not None else None
+    if cached is not None:
+        if on_text is not None:
+            on_text(cached["message"])
+        if alternatives is not None:
+            alternatives.extend(cached["alternatives"])
+        return cached["message"]
+    
+    parts = []
+    others = []
+    for text in stream_commit_message(diff, additional_messages, max_first_line, others):
+        parts.append(text)
+        if on_text is not None:
+            on_text(text)
+    
+    commit_message = "".join(parts).strip()
+    if not commit_message:
+        raise ValueError("OpenAI API error: Generated commit message is empty")
+    if alternatives is not None:
+        alternatives.extend(others)
+    
+    # A response cut short for its long first line is not worth keeping
+    if key is not None and not (
+            max_first_line is not None and _first_line_too_long(commit_message, max_first_line)[0]):
+        cache.put(key, {"message": commit_message, "alternatives": others})
+    
+    return commit_message
 
-def commit_changes(message: str):
-    """Commit changes with the generated message."""
+def commit_changes(message: str, was_staged: bool = None):
+    """Commit changes with the generated message.
+
+    ``was_staged`` is the flag returned by ``get_git_diff``. When it is
+    given, git is not asked again whether anything is staged.
+    """
     if not message or not message.strip():
         raise ValueError("Commit message cannot be empty")
-        
-    try:
-        repo = git.Repo(search_parent_directories=True)
-        
+    
+    if was_staged is None:
         # If nothing is staged, stage all changes
-        if not repo.git.diff('--cached'):
-            repo.git.add('.')
+        if not _has_staged_changes():
+            _run_git('add', '--all')
         
         # Validate that we have changes to commit
-        if not repo.git.diff('--cached'):
+        if not _has_staged_changes():
             raise ValueError("No changes staged for commit")
-            
-        repo.index.commit(message)
-        return True
+    elif not was_staged:
+        # The diff was taken from unstaged changes, so stage them all
+        _run_git('add', '--all')
     
-    except git.InvalidGitRepositoryError:
-        raise ValueError("Not a git repository")
-    except git.GitCommandError as e:
-        raise ValueError(f"Git error: {str(e)}")
+    # Keep the message exactly as generated, including lines starting with '#',
+    # and pass it on stdin so its length is not bound by the command line
+    _run_git('commit', '--quiet', '--cleanup=verbatim', '--file=-', input=message)
+    return True
@@ -2,28 +2,39 @@
 Custom exceptions for ez-commit
 """
 
+from enum import IntEnum
+
+class ExitCodes(IntEnum):
+    """Exit codes returned by the ez-commit commands."""
+    SUCCESS = 0
+    ERROR = 1
+    GIT_ERROR = 2
+    API_ERROR = 3
+    CONFIG_ERROR = 4
+    EDITOR_ERROR = 5
+
 class EzCommitError(Exception):
     """Base exception for all ez-commit errors."""
-    def __init__(self, message, exit_code=1):
+    def __init__(self, message, exit_code=ExitCodes.ERROR):
         super().__init__(message)
         self.exit_code = exit_code
 
 class GitError(EzCommitError):
     """Raised when a git operation fails."""
     def __init__(self, message):
-        super().__init__(message, exit_code=2)
+        super().__init__(message, exit_code=ExitCodes.GIT_ERROR)
 
 class APIError(EzCommitError):
     """Raised when an API operation fails."""
     def __init__(self, message):
-        super().__init__(message, exit_code=3)
+        super().__init__(message, exit_code=ExitCodes.API_ERROR)
 
 class ConfigError(EzCommitError):
     """Raised when a configuration operation fails."""
     def __init__(self, message):
-        super().__init__(message, exit_code=4)
+        super().__init__(message, exit_code=ExitCodes.CONFIG_ERROR)
 
 class EditorError(EzCommitError):
     """Raised when an editor operation fails."""
     def __init__(self, message):
-        super().__init__(message, exit_code=5)
+        super().__init__(message, exit_code=ExitCodes.EDITOR_ERROR)
@@ -2,63 +2,187 @@
 UI components for ez-commit
 """
 
+import io
+import os
+import re
 import sys
+import contextlib
 import click
 
+try:
+    import termios
+    import tty
+except ImportError:  # Windows
+    termios = None
+
+_CLEAR_SCREEN = '\033[2J\033[H'
+_CLEAR_LINE = '\033[A\033[K'
+_SEPARATOR = "-" * 50
+
+_ACTIONS = (
+    ("(e)dit", "green", "Edit the commit message"),
+    ("(c)ancel", "red", "Cancel the commit"),
+    ("(i)nteractive", "yellow", "Provide feedback"),
+    ("(s)ave", "blue", "Save and commit"),
+)
+# Only offered when there are other candidate messages
+_NEXT_ACTION = ("(n)ext", "magenta", "Show the next suggestion")
+
+def _format_actions(actions, color):
+    """Render the action menu as one string, styled if ``color`` is set."""
+    lines = ["\nAvailable Actions:"]
+    for action, fg, description in actions:
+        lines.append(f"{click.style(action, fg=fg) if color else action}      - {description}")
+    return "\n".join(lines) + "\n"
+
+# The menu is static, so render every variant once at import instead of per
+# redraw, keyed by (color, show_next)
+_ACTIONS_TEXT = {
+    (color, show_next): _format_actions(_ACTIONS + ((_NEXT_ACTION,) if show_next else ()), color)
+    for color in (True, False)
+    for show_next in (True, False)
+}
+
+_CONFIG_HEADER = click.style("\nCurrent Configuration:", fg="blue")
+_PLAIN_CONFIG_HEADER = "\nCurrent Configuration:"
+
+# Implementation details stripped from errors before showing them
+_ERROR_NOISE = re.compile(r"ValueError: |Exception: |Error: |Failed to |Unable to ")
+
+_CHOICE_PROMPT = "\nSelect an action: "
+_VALID_CHOICES = frozenset('ecis')
+_VALID_CHOICES_WITH_NEXT = _VALID_CHOICES | {'n'}
+_INVALID_CHOICE_MESSAGE = "Invalid choice. Please select (e)dit, (c)ancel, (i)nteractive, or (s)ave"
+_INVALID_CHOICE_WITH_NEXT_MESSAGE = "Invalid choice. Please select (e)dit, (c)ancel, (i)nteractive, (s)ave, or (n)ext"
+
+@contextlib.contextmanager
+def _cbreak_stdin():
+    """Put stdin into cbreak mode, yielding its fd or None if it is not a terminal."""
+    fd = None
+    if termios is not None:
+        try:
+            fd = sys.stdin.fileno()
+            old_attrs = termios.tcgetattr(fd)
+        except (AttributeError, ValueError, OSError, termios.error):
+            fd = None
+
+    if fd is None:
+        yield None
+        return
+
+    try:
+        tty.setcbreak(fd)
+        yield fd
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_attrs)
+
 class TerminalUI:
     """Handles terminal display and user interaction."""
     
+    def __init__(self, color=None):
+        # Only build ANSI styles when the stream is a terminal; click would
+        # strip them again on write anyway
+        if color is None:
+            self._color = sys.stdout.isatty()
+            self._err_color = sys.stderr.isatty()
+        else:
+            self._color = self._err_color = color
+        # Streamed text is only redrawn as a panel on a terminal; anywhere
+        # else it would end up in the output next to the final message
+        self._streams = sys.stdout.isatty()
+        # Multi-line screens are collected here and written out in one go
+        self._buf = io.StringIO()
+
+    @property
+    def streams(self) -> bool:
+        """Whether messages should be shown as they stream in."""
+        return self._streams
+
+    def _style(self, text, fg):
+        """Style text for stdout, or return it unchanged without color."""
+        return click.style(text, fg=fg) if self._color else text
+
+    def _secho(self, message, fg, err=False):
+        """Echo a message, styled only if the target stream shows color."""
+        kwargs = {"err": True} if err else {}
+        if self._err_color if err else self._color:
+            click.secho(message, fg=fg, **kwargs)
+        else:
+            click.echo(message, **kwargs)
+
+    def _write(self, text="", fg=None):
+        """Queue a line for the next flush, styled if ``fg`` is given."""
+        line = self._style(text, fg) if fg else text
+        self._buf.write(f"{line}\n")
+
+    def _flush(self):
+        """Write everything queued since the last flush as a single echo."""
+        click.echo(self._buf.getvalue(), nl=False)
+        self._buf.seek(0)
+        self._buf.truncate(0)
+
     def clear_screen(self):
         """Clear the terminal screen and move cursor to top."""
-        click.echo('\033[2J\033[H', nl=False)
+        click.echo(_CLEAR_SCREEN, nl=False)
 
     def clear_lines(self, n):
         """Clear the last n lines in terminal."""
-        for _ in range(n):
-            click.echo('\033[A\033[K', nl=False)
+        click.echo(_CLEAR_LINE * n, nl=False)
 
     def display_message(self, message, title=None, status=None):
         """Display a message with optional title and status."""
-        self.clear_screen()
+        # Render the whole panel, screen clear included, as a single write
+        lines = []
         if status:
-            click.secho(status, fg="blue")
-        
+            lines.append(self._style(status, "blue"))
         if title:
-            click.echo(title)
-        click.echo("-" * 50)
-        click.echo(message)
-        click.echo("-" * 50)
-
-    def display_actions(self):
-        """Display available actions."""
-        click.echo("\nAvailable Actions:")
-        actions = [
-            (click.style("(e)dit", fg="green"), "Edit the commit message"),
-            (click.style("(c)ancel", fg="red"), "Cancel the commit"),
-            (click.style("(i)nteractive", fg="yellow"), "Provide feedback"),
-            (click.style("(s)ave", fg="blue"), "Save and commit")
-        ]
-        for action, description in actions:
-            click.echo(f"{action}      - {description}")
-
-    def get_user_choice(self):
+            lines.append(title)
+        lines.extend((_SEPARATOR, message, _SEPARATOR))
+        click.echo(_CLEAR_SCREEN + "\n".join(lines))
+
+    def display_stream_header(self, title):
+        """Clear the screen and draw the panel header for a streamed message."""
+        click.echo(_CLEAR_SCREEN + "\n".join((title, _SEPARATOR)))
+
+    def display_partial(self, text):
+        """Write part of a message as it streams in, without a newline."""
+        click.echo(text, nl=False)
+
+    def display_actions(self, show_next=False):
+        """Display available actions, including (n)ext if ``show_next`` is set."""
+        click.echo(_ACTIONS_TEXT[bool(self._color), bool(show_next)], nl=False)
+
+    def get_user_choice(self, allow_next=False):
         """Get user choice for commit message action."""
-        while True:
-            click.echo("\nSelect an action: ", nl=False)
-            choice = click.getchar().lower()
-            if choice in ['e', 'c', 'i', 's']:
-                click.echo(choice)  # Echo the choice since getchar doesn't
-                return choice
-            self.clear_lines(1)
-            self._print_error("Invalid choice. Please select (e)dit, (c)ancel, (i)nteractive, or (s)ave")
-            self.clear_lines(1)
+        valid_choices = _VALID_CHOICES_WITH_NEXT if allow_next else _VALID_CHOICES
+        invalid_message = _INVALID_CHOICE_WITH_NEXT_MESSAGE if allow_next else _INVALID_CHOICE_MESSAGE
+        prompt = _CHOICE_PROMPT
+        # Switch the terminal mode once for the whole prompt rather than per keypress
+        with _cbreak_stdin() as fd:
+            while True:
+                click.echo(prompt, nl=False)
+                if fd is None:
+                    choice = click.getchar().lower()
+                else:
+                    # Read the whole key press at once so an arrow key's escape
+                    # sequence counts as one invalid choice rather than three
+                    key = os.read(fd, 32)
+                    if key in (b'', b'\x04'):  # EOF or Ctrl-D
+                        raise EOFError()
+                    choice = key.decode('utf-8', errors='ignore')[:1].lower()
+                if choice in valid_choices:
+                    click.echo(choice)  # Echo the choice since the terminal doesn't
+                    return choice
+                self.clear_lines(1)
+                self._print_error(invalid_message)
+                # Clear the error's line in the same write as the next prompt
+                prompt = _CLEAR_LINE + _CHOICE_PROMPT
 
     def get_user_feedback(self, current_message):
         """Get user feedback for interactive mode."""
-        self.clear_screen()
         self.display_message(current_message, "Current commit message")
         
-        click.secho("\nEnter your suggested changes:", fg="yellow")
+        self._secho("\nEnter your suggested changes:", "yellow")
         return click.prompt("", prompt_suffix="\n", type=str)
 
     def confirm_action(self, message: str) -> bool:
@@ -68,7 +192,7 @@ class TerminalUI:
     def _print_error(self, message: str):
         """Print error message to stderr with proper formatting."""
         program_name = "ez-commit"
-        click.secho(f"{program_name}: error: {message}", fg="red", err=True)
+        self._secho(f"{program_name}: error: {message}", "red", err=True)
 
     def display_error(self, message: str):
         """Display an error message to stderr."""
@@ -76,48 +200,45 @@ class TerminalUI:
 
     def _sanitize_error(self, message: str) -> str:
         """Remove implementation details and format error for user display."""
-        # Remove common Python error prefixes
-        message = str(message)
-        if ": " in message:
-            message = message.split(": ")[-1]
+        if message is None:
+            return ""
         
-        # Remove implementation details
-        replacements = {
-            "ValueError: ": "",
-            "Exception: ": "",
-            "Error: ": "",
-            "Failed to ": "",
-            "Unable to ": "",
-        }
-        for old, new in replacements.items():
-            message = message.replace(old, new)
+        # Remove common Python error prefixes by keeping only the text after
+        # the last ": " (the whole message if there is none)
+        message = str(message).rpartition(": ")[2]
         
-        return message.strip()
+        # Remove implementation details
+        return _ERROR_NOISE.sub("", message).strip()
 
     def display_success(self, message: str):
         """Display a success message."""
-        click.secho(message, fg="green")
+        self._secho(message, "green")
 
     def display_info(self, message: str):
         """Display an info message."""
-        click.secho(message, fg="blue")
+        self._secho(message, "blue")
 
     def display_warning(self, message: str):
         """Display a warning message to stderr."""
         program_name = "ez-commit"
-        click.secho(f"{program_name}: warning: {message}", fg="yellow", err=True)
+        self._secho(f"{program_name}: warning: {message}", "yellow", err=True)
 
     def display_config(self, config: dict):
         """Display configuration information."""
-        click.secho("\nCurrent Configuration:", fg="blue")
-        click.echo("-" * 50)
-        
-        # Style values separately to match test expectations
-        model = click.style(config['openai']['model'], fg='green')
-        temp = click.style(str(config['openai']['temperature']), fg='green')
+        # Style values separately to match test expectations. Look everything
+        # up before queueing anything, so a bad config can't leave half a
+        # panel in the buffer for the next screen. Missing sections and
+        # values show as empty rather than failing
+        openai = config.get('openai') or {}
+        model = self._style(str(openai.get('model', '')), 'green')
+        temp = self._style(str(openai.get('temperature', '')), 'green')
+        system_prompt = config.get('system_prompt', '')
         
-        click.echo(f"Model: {model}")
-        click.echo(f"Temperature: {temp}")
-        click.echo("\nSystem Prompt:")
-        click.echo(config['system_prompt'])
-        click.echo("-" * 50)
+        self._write(_CONFIG_HEADER if self._color else _PLAIN_CONFIG_HEADER)
+        self._write(_SEPARATOR)
+        self._write(f"Model: {model}")
+        self._write(f"Temperature: {temp}")
+        self._write("\nSystem Prompt:")
+        self._write(system_prompt)
+        self._write(_SEPARATOR)
+        self._flush()
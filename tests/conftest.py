@@ -0,0 +1,35 @@
+"""
+Shared fixtures for the ez-commit tests
+"""
+
+import pytest
+from unittest.mock import Mock
+
+@pytest.fixture(scope="session")
+def mock_specs():
+    """Attribute names of everything the tests mock, introspected once per session."""
+    # Imported here so collecting the tests doesn't import click
+    from ez_commit import config, core
+    from ez_commit.ui import TerminalUI
+    from ez_commit.commands import EditorHandler, CommitHandler, ConfigHandler
+    specced = {
+        'ui': TerminalUI,
+        'config': config,
+        'core': core,
+        'editor': EditorHandler,
+        'commit_handler': CommitHandler,
+        'config_handler': ConfigHandler,
+    }
+    return {
+        key: [name for name in dir(obj) if not name.startswith('__')]
+        for key, obj in specced.items()
+    }
+
+@pytest.fixture
+def mock_triple(mock_specs):
+    """Fresh (ui, commit_handler, config_handler) mocks limited to the real attributes."""
+    return (
+        Mock(spec=mock_specs['ui']),
+        Mock(spec=mock_specs['commit_handler']),
+        Mock(spec=mock_specs['config_handler']),
+    )
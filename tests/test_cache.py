@@ -0,0 +1,103 @@
+"""
+Tests for the response cache
+"""
+
+import copy
+import os
+import pytest
+from ez_commit import cache, config, core
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    """Keep the cache in a fresh directory for every test."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Deterministic default settings, editable by the test before generating."""
+    cfg = copy.deepcopy(config.DEFAULT_CONFIG)
+    cfg["openai"]["temperature"] = 0.0
+    monkeypatch.setattr(core, '_settings', lambda: (cfg, "test-key"))
+    return cfg
+
+@pytest.fixture
+def stream(monkeypatch):
+    """Stand in for the API, answering every request with ``stream.reply``."""
+    def fake_stream(diff, additional_messages, max_first_line, alternatives):
+        fake_stream.calls += 1
+        alternatives.extend(fake_stream.alternatives)
+        yield fake_stream.reply
+    fake_stream.calls = 0
+    fake_stream.reply = "Add feature"
+    fake_stream.alternatives = []
+    monkeypatch.setattr(core, 'stream_commit_message', fake_stream)
+    return fake_stream
+
+def test_make_key_is_stable():
+    key = cache.make_key(diff="test diff", model="gpt-4", temperature=0.0)
+    
+    assert key == cache.make_key(temperature=0.0, model="gpt-4", diff="test diff")
+    assert key != cache.make_key(diff="other diff", model="gpt-4", temperature=0.0)
+
+def test_put_get_round_trip():
+    assert cache.get("missing") is None
+    
+    cache.put("key", {"message": "Add feature", "alternatives": []})
+    
+    assert cache.get("key") == {"message": "Add feature", "alternatives": []}
+
+def test_prune_keeps_max_entries(monkeypatch):
+    for i in range(5):
+        cache.put(f"key{i}", {"message": str(i)})
+    cache_dir = cache.get_cache_dir()
+    # Make the write order unambiguous
+    for i in range(5):
+        os.utime(cache_dir / f"key{i}.json", ns=(i * 10**9, i * 10**9))
+    monkeypatch.setattr(cache, 'MAX_ENTRIES', 3)
+    
+    cache._prune(cache_dir)
+    
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["key2.json", "key3.json", "key4.json"]
+
+def test_cache_dir_needs_windows_app_data(monkeypatch):
+    monkeypatch.setattr(cache.platform, 'system', lambda: "Windows")
+    monkeypatch.delenv("LOCALAPPDATA", raising=False)
+    monkeypatch.delenv("APPDATA", raising=False)
+    
+    with pytest.raises(ValueError, match="LOCALAPPDATA or APPDATA"):
+        cache.get_cache_dir()
+
+def test_cache_hit_restores_alternatives(settings, stream):
+    settings["openai"]["n_candidates"] = 2
+    stream.alternatives = ["Fix bug"]
+    core.generate_commit_message("test diff", alternatives=[])
+    
+    received = []
+    alternatives = []
+    message = core.generate_commit_message("test diff", on_text=received.append,
+                                           alternatives=alternatives)
+    
+    assert message == "Add feature"
+    assert received == ["Add feature"]
+    assert alternatives == ["Fix bug"]
+    assert stream.calls == 1
+
+@pytest.mark.parametrize("sampled, calls", [(False, 2), (True, 1)],
+                         ids=["bypassed", "opted_in"])
+def test_sampled_responses_need_opt_in(settings, stream, sampled, calls):
+    settings["openai"]["temperature"] = 0.7
+    settings["cache"]["sampled"] = sampled
+    
+    core.generate_commit_message("test diff")
+    core.generate_commit_message("test diff")
+    
+    assert stream.calls == calls
+
+def test_too_long_subject_not_cached(settings, stream):
+    stream.reply = "x" * 11
+    
+    core.generate_commit_message("test diff", max_first_line=10)
+    core.generate_commit_message("test diff", max_first_line=10)
+    
+    assert stream.calls == 2
@@ -3,289 +3,247 @@ Tests for the command-line interface
 """
 
 import pytest
-from unittest.mock import Mock, patch
-from click.testing import CliRunner
-from ez_commit.cli import main, config, create_handlers
-from ez_commit.exceptions import GitError, APIError, ConfigError, EditorError
+from unittest.mock import Mock
+from ez_commit.commands import CommitHandler, ConfigHandler
+from ez_commit.exceptions import GitError, APIError, ConfigError, EditorError, ExitCodes
 
-@pytest.fixture
+# click and the CLI are imported by the fixtures rather than at collection,
+# so running unrelated tests doesn't pay for them
+@pytest.fixture(scope="session")
 def runner():
+    from click.testing import CliRunner
+    # invoke() sets up fresh streams and returns a new Result on every call
     return CliRunner()
 
-@pytest.fixture
-def mock_handlers():
-    ui = Mock()
-    commit_handler = Mock()
-    config_handler = Mock()
-    return ui, commit_handler, config_handler
-
-def test_create_handlers():
-    ui, commit_handler, config_handler = create_handlers()
+@pytest.fixture(scope="session")
+def cli_module():
+    import ez_commit.cli
+    return ez_commit.cli
+
+def drive_ui(ui, choices):
+    """Answer the action prompt with each character of ``choices`` in turn."""
+    ui.get_user_choice.side_effect = iter(choices)
+
+@pytest.fixture(autouse=True)
+def patched_handlers(monkeypatch, mock_triple):
+    """Make the commands use the mock handlers instead of building real ones."""
+    monkeypatch.setattr('ez_commit.cli.create_handlers', lambda **kwargs: mock_triple)
+    return mock_triple
+
+def test_create_handlers(cli_module, monkeypatch):
+    # Put the real create_handlers back
+    monkeypatch.undo()
+    ui, commit_handler, config_handler = cli_module.create_handlers()
     assert ui is not None
     assert commit_handler is not None
     assert config_handler is not None
 
-def test_main_preview(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.return_value = (True, None)
-        commit_handler.current_message = "test message"
-        
-        result = runner.invoke(main, ['--preview'])
-        
-        assert result.exit_code == 0
-        ui.display_message.assert_called_once()
-
-def test_main_git_error(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.side_effect = GitError("could not read git diff")
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 2
-        ui.display_error.assert_called_once_with("could not read git diff")
-
-def test_main_binary_file_error(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.side_effect = GitError("binary files detected in diff")
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 2
-        ui.display_error.assert_called_once_with("binary files detected in diff")
-
-def test_main_api_error(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.side_effect = APIError("could not connect to OpenAI API")
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 3
-        ui.display_error.assert_called_once_with("could not connect to OpenAI API")
-
-def test_main_invalid_commit_message(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.side_effect = GitError("invalid commit message format")
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 2
-        ui.display_error.assert_called_once_with("invalid commit message format")
-
-def test_main_cancel(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.return_value = (True, None)
-        commit_handler.current_message = "test message"
-        ui.get_user_choice.return_value = 'c'
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 1
-        ui.display_info.assert_called_with("\nCommit cancelled.")
-
-def test_main_edit(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.return_value = (True, None)
-        commit_handler.current_message = "test message"
-        ui.get_user_choice.side_effect = ['e', 's']
-        commit_handler.handle_save.return_value = (True, None)
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 0
-        commit_handler.handle_edit.assert_called_once()
-
-def test_main_edit_invalid_message(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.return_value = (True, None)
-        commit_handler.current_message = "test message"
-        ui.get_user_choice.side_effect = ['e']
-        commit_handler.handle_edit.side_effect = GitError("first line must be non-empty and under 50 characters")
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 2
-        ui.display_error.assert_called_once_with("first line must be non-empty and under 50 characters")
-
-def test_main_interactive(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.return_value = (True, None)
-        commit_handler.current_message = "test message"
-        ui.get_user_choice.side_effect = ['i', 's']
-        commit_handler.handle_interactive.return_value = (True, None)
-        commit_handler.handle_save.return_value = (True, None)
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 0
-        commit_handler.handle_interactive.assert_called_once()
-
-def test_main_interactive_api_error(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.return_value = (True, None)
-        commit_handler.current_message = "test message"
-        ui.get_user_choice.side_effect = ['i']
-        commit_handler.handle_interactive.side_effect = APIError("could not generate new commit message")
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 3
-        ui.display_error.assert_called_once_with("could not generate new commit message")
-
-def test_main_save_success(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.return_value = (True, None)
-        commit_handler.current_message = "test message"
-        ui.get_user_choice.return_value = 's'
-        commit_handler.handle_save.return_value = (True, None)
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 0
-        commit_handler.handle_save.assert_called_once()
-
-def test_main_save_failure(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, commit_handler, _ = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, commit_handler, None)
-        commit_handler.initialize.return_value = (True, None)
-        commit_handler.current_message = "test message"
-        ui.get_user_choice.return_value = 's'
-        commit_handler.handle_save.side_effect = GitError("could not commit changes")
-        
-        result = runner.invoke(main)
-        
-        assert result.exit_code == 2
-        ui.display_error.assert_called_once_with("could not commit changes")
+def test_main_preview(runner, cli_module, patched_handlers):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.return_value = (True, None)
+    commit_handler.current_message = "test message"
+    
+    result = runner.invoke(cli_module.main, ['--preview'])
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    ui.display_message.assert_called_once()
+
+def test_main_preview_redirected(runner, cli_module, monkeypatch, mock_specs):
+    # Real UI and handler over a mock core; the runner's output isn't a terminal
+    core = Mock(spec=mock_specs['core'])
+    core.get_git_diff.return_value = ("test diff", True)
+    def generate(diff, on_text=None, **kwargs):
+        if on_text is not None:
+            on_text("Add feature")
+        return "Add feature"
+    core.generate_commit_message.side_effect = generate
+    def create_handlers(**kwargs):
+        ui = cli_module.TerminalUI()
+        return ui, CommitHandler(ui, core, Mock()), None
+    monkeypatch.setattr('ez_commit.cli.create_handlers', create_handlers)
+    
+    result = runner.invoke(cli_module.main, ['--preview'])
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    # Written once, as the finished panel, with no streaming header
+    assert result.output.count("Add feature") == 1
+    assert "Generating Commit Message" not in result.output
+
+# An initialize outcome is either an exception it raises or the
+# (success, error) pair it returns
+@pytest.mark.parametrize("outcome, error, exit_code", [
+    (GitError("could not read git diff"), "could not read git diff", ExitCodes.GIT_ERROR),
+    (GitError("binary files detected in diff"), "binary files detected in diff", ExitCodes.GIT_ERROR),
+    (APIError("could not connect to OpenAI API"), "could not connect to OpenAI API", ExitCodes.API_ERROR),
+    ((False, "invalid commit message format"), "invalid commit message format", ExitCodes.GIT_ERROR),
+], ids=["git", "binary_file", "api", "invalid_commit_message"])
+def test_main_initialize_error(runner, cli_module, patched_handlers, outcome, error, exit_code):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.side_effect = [outcome]
+    
+    result = runner.invoke(cli_module.main)
+    
+    assert result.exit_code == exit_code
+    ui.display_error.assert_called_once_with(error)
+    ui.get_user_choice.assert_not_called()
+
+def test_main_cancel(runner, cli_module, patched_handlers):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.return_value = (True, None)
+    commit_handler.current_message = "test message"
+    drive_ui(ui, 'c')
+    
+    result = runner.invoke(cli_module.main)
+    
+    assert result.exit_code == ExitCodes.ERROR
+    ui.display_info.assert_called_with("\nCommit cancelled.")
+    commit_handler.close.assert_called_once_with()
+
+def test_main_edit(runner, cli_module, patched_handlers):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.return_value = (True, None)
+    commit_handler.current_message = "test message"
+    drive_ui(ui, 'es')
+    commit_handler.handle_save.return_value = (True, None)
+    
+    result = runner.invoke(cli_module.main)
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    commit_handler.handle_edit.assert_called_once()
+
+def test_main_edit_invalid_message(runner, cli_module, patched_handlers):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.return_value = (True, None)
+    commit_handler.current_message = "test message"
+    drive_ui(ui, 'e')
+    commit_handler.handle_edit.side_effect = GitError("first line must be non-empty and under 50 characters")
+    
+    result = runner.invoke(cli_module.main)
+    
+    assert result.exit_code == ExitCodes.GIT_ERROR
+    ui.display_error.assert_called_once_with("first line must be non-empty and under 50 characters")
+
+def test_main_interactive(runner, cli_module, patched_handlers):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.return_value = (True, None)
+    commit_handler.current_message = "test message"
+    drive_ui(ui, 'is')
+    commit_handler.handle_interactive.return_value = (True, None)
+    commit_handler.handle_save.return_value = (True, None)
+    
+    result = runner.invoke(cli_module.main)
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    commit_handler.handle_interactive.assert_called_once()
+
+def test_main_interactive_api_error(runner, cli_module, patched_handlers):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.return_value = (True, None)
+    commit_handler.current_message = "test message"
+    drive_ui(ui, 'i')
+    commit_handler.handle_interactive.side_effect = APIError("could not generate new commit message")
+    
+    result = runner.invoke(cli_module.main)
+    
+    assert result.exit_code == ExitCodes.API_ERROR
+    ui.display_error.assert_called_once_with("could not generate new commit message")
+
+def test_main_save_success(runner, cli_module, patched_handlers):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.return_value = (True, None)
+    commit_handler.current_message = "test message"
+    drive_ui(ui, 's')
+    commit_handler.handle_save.return_value = (True, None)
+    
+    result = runner.invoke(cli_module.main)
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    commit_handler.handle_save.assert_called_once()
+
+def test_main_save_failure(runner, cli_module, patched_handlers):
+    ui, commit_handler, _ = patched_handlers
+    commit_handler.initialize.return_value = (True, None)
+    commit_handler.current_message = "test message"
+    drive_ui(ui, 's')
+    commit_handler.handle_save.side_effect = GitError("could not commit changes")
+    
+    result = runner.invoke(cli_module.main)
+    
+    assert result.exit_code == ExitCodes.GIT_ERROR
+    ui.display_error.assert_called_once_with("could not commit changes")
 
 # Config command tests
-def test_config_edit(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.edit_config.return_value = (True, None)
-        
-        result = runner.invoke(config, ['edit'])
-        
-        assert result.exit_code == 0
-        config_handler.edit_config.assert_called_once()
-
-def test_config_reset_success(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.reset_config.return_value = (True, None)
-        
-        result = runner.invoke(config, ['reset'])
-        
-        assert result.exit_code == 0
-        config_handler.reset_config.assert_called_once_with(ui)
-
-def test_config_reset_failure(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.reset_config.side_effect = ConfigError("could not reset configuration")
-        
-        result = runner.invoke(config, ['reset'])
-        
-        assert result.exit_code == 4
-        ui.display_error.assert_called_once_with("could not reset configuration")
-
-def test_config_set_api_key_empty(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.set_api_key.return_value = (False, "API key cannot be empty")
-        
-        result = runner.invoke(config, ['set-api-key', ''])
-        
-        assert result.exit_code == 4
-        ui.display_error.assert_called_once_with("API key cannot be empty")
-
-def test_config_set_model_empty(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.set_model.return_value = (False, "model name cannot be empty")
-        
-        result = runner.invoke(config, ['set-model', ''])
-        
-        assert result.exit_code == 4
-        ui.display_error.assert_called_once_with("model name cannot be empty")
-
-def test_config_set_temperature_invalid(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.set_temperature.return_value = (False, "temperature must be between 0.0 and 1.0")
-        
-        result = runner.invoke(config, ['set-temperature', '1.5'])
-        
-        assert result.exit_code == 4
-        ui.display_error.assert_called_once_with("temperature must be between 0.0 and 1.0")
-
-def test_config_set_temperature_scientific(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.set_temperature.return_value = (False, "temperature must be a decimal number between 0.0 and 1.0")
-        
-        result = runner.invoke(config, ['set-temperature', '1e-2'])
-        
-        assert result.exit_code == 4
-        ui.display_error.assert_called_once_with("temperature must be a decimal number between 0.0 and 1.0")
-
-def test_config_edit_prompt_empty(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.edit_prompt.return_value = (False, "system prompt cannot be empty")
-        
-        result = runner.invoke(config, ['edit-prompt'])
-        
-        assert result.exit_code == 4
-        ui.display_error.assert_called_once_with("system prompt cannot be empty")
-
-def test_config_show_success(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.show_config.return_value = ({}, None)
-        
-        result = runner.invoke(config, ['show'])
-        
-        assert result.exit_code == 0
-        config_handler.show_config.assert_called_once()
-
-def test_config_show_failure(runner):
-    with patch('ez_commit.cli.create_handlers') as mock_create:
-        ui, _, config_handler = Mock(), Mock(), Mock()
-        mock_create.return_value = (ui, None, config_handler)
-        config_handler.show_config.side_effect = ConfigError("could not load configuration")
-        
-        result = runner.invoke(config, ['show'])
-        
-        assert result.exit_code == 4
-        ui.display_error.assert_called_once_with("could not load configuration")
+def test_config_edit(runner, cli_module, patched_handlers):
+    ui, _, config_handler = patched_handlers
+    config_handler.edit_config.return_value = (True, None)
+    
+    result = runner.invoke(cli_module.config, ['edit'])
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    config_handler.edit_config.assert_called_once()
+
+def test_config_reset_success(runner, cli_module, patched_handlers):
+    ui, _, config_handler = patched_handlers
+    config_handler.reset_config.return_value = (True, None)
+    
+    result = runner.invoke(cli_module.config, ['reset'])
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    config_handler.reset_config.assert_called_once_with(ui)
+
+def test_config_reset_failure(runner, cli_module, patched_handlers):
+    ui, _, config_handler = patched_handlers
+    config_handler.reset_config.side_effect = ConfigError("could not reset configuration")
+    
+    result = runner.invoke(cli_module.config, ['reset'])
+    
+    assert result.exit_code == ExitCodes.CONFIG_ERROR
+    ui.display_error.assert_called_once_with("could not reset configuration")
+
+@pytest.mark.parametrize("args, handler_method, error", [
+    (['set-api-key', ''], 'set_api_key', "API key cannot be empty"),
+    (['set-model', ''], 'set_model', "model name cannot be empty"),
+    (['set-temperature', '1.5'], 'set_temperature', "temperature must be between 0.0 and 1.0"),
+    (['edit-prompt'], 'edit_prompt', "system prompt cannot be empty"),
+], ids=["set_api_key_empty", "set_model_empty", "set_temperature_invalid", "edit_prompt_empty"])
+def test_config_rejected_value(runner, cli_module, patched_handlers, args, handler_method, error):
+    ui, _, config_handler = patched_handlers
+    getattr(config_handler, handler_method).return_value = (False, error)
+    
+    # Through the top-level group, so the code has to make it out of both
+    result = runner.invoke(cli_module.main, ['config', *args])
+    
+    assert result.exit_code == ExitCodes.CONFIG_ERROR
+    ui.display_error.assert_called_once_with(error)
+
+def test_config_set_temperature_scientific(runner, cli_module, patched_handlers, monkeypatch, mock_specs):
+    # The real handler accepts scientific notation
+    ui = patched_handlers[0]
+    config = Mock(spec=mock_specs['config'])
+    config.load_config.return_value = {"openai": {"temperature": 0.7}}
+    monkeypatch.setattr('ez_commit.cli.create_handlers',
+                        lambda **kwargs: (ui, None, ConfigHandler(config, Mock())))
+    
+    result = runner.invoke(cli_module.main, ['config', 'set-temperature', '1e-2'])
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    config.save_config.assert_called_once_with({"openai": {"temperature": 0.01}})
+    ui.display_success.assert_called_once_with("Temperature updated to: 0.01")
+
+def test_config_show_success(runner, cli_module, patched_handlers):
+    ui, _, config_handler = patched_handlers
+    config_handler.show_config.return_value = ({}, None)
+    
+    result = runner.invoke(cli_module.config, ['show'])
+    
+    assert result.exit_code == ExitCodes.SUCCESS
+    config_handler.show_config.assert_called_once()
+
+def test_config_show_failure(runner, cli_module, patched_handlers):
+    ui, _, config_handler = patched_handlers
+    config_handler.show_config.side_effect = ConfigError("could not load configuration")
+    
+    result = runner.invoke(cli_module.config, ['show'])
+    
+    assert result.exit_code == ExitCodes.CONFIG_ERROR
+    ui.display_error.assert_called_once_with("could not load configuration")
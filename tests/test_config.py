@@ -0,0 +1,86 @@
+"""
+Tests for the config file and its caches
+"""
+
+import copy
+import os
+import pytest
+from ez_commit import config
+
+@pytest.fixture(autouse=True)
+def config_file(tmp_path, monkeypatch):
+    """A default config file in a fresh directory, loaded once so its cache exists."""
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+    monkeypatch.setattr(config, '_last_saved', None)
+    config.invalidate_config_cache()
+    config.load_config()
+    yield config.get_config_file()
+    config.invalidate_config_cache()
+
+def replace_model(config_file, old, new, mtime_ns):
+    """Swap the model in the YAML text and pin the file's mtime."""
+    config_file.write_text(config_file.read_text().replace(f"model: {old}", f"model: {new}"))
+    os.utime(config_file, ns=(mtime_ns, mtime_ns))
+    # Leave only the on-disk cache to go by
+    config.invalidate_config_cache()
+
+def test_cache_is_used_while_file_is_unchanged(config_file):
+    cache_file = config.get_cache_file()
+    version, _ = cache_file.read_text().split("\n", 1)
+    cached = copy.deepcopy(config.DEFAULT_CONFIG)
+    cached["openai"]["model"] = "from-cache"
+    config._write_config_cache(version, cached)
+    config.invalidate_config_cache()
+    
+    assert config.load_config()["openai"]["model"] == "from-cache"
+
+def test_mtime_change_invalidates_cache(config_file):
+    mtime = config_file.stat().st_mtime_ns
+    
+    # Same size, so only the mtime shows the file changed
+    replace_model(config_file, "gpt-4", "gpt-5", mtime + 10**9)
+    
+    assert config.load_config()["openai"]["model"] == "gpt-5"
+
+def test_size_change_invalidates_cache(config_file):
+    mtime = config_file.stat().st_mtime_ns
+    
+    # Same mtime, so only the size shows the file changed
+    replace_model(config_file, "gpt-4", "gpt-4o-mini", mtime)
+    
+    assert config.load_config()["openai"]["model"] == "gpt-4o-mini"
+
+def test_corrupt_cache_falls_back_to_yaml(config_file):
+    cache_file = config.get_cache_file()
+    version, _ = cache_file.read_text().split("\n", 1)
+    cache_file.write_text(f"{version}\n{{not json")
+    config.invalidate_config_cache()
+    
+    assert config.load_config() == config.DEFAULT_CONFIG
+    # and the cache is rebuilt from the YAML
+    assert config._read_config_cache(version) is not None
+
+def test_save_skips_identical_rewrite(config_file, monkeypatch):
+    cfg = config.load_config()
+    cfg["openai"]["model"] = "gpt-5"
+    config.save_config(cfg)
+    replaced = []
+    monkeypatch.setattr(config.os, 'replace', lambda *args: replaced.append(args))
+    
+    config.save_config(cfg)
+    
+    assert replaced == []
+
+def test_failed_write_leaves_config_untouched(config_file, monkeypatch):
+    before = config_file.read_bytes()
+    def failing_fsync(fd):
+        raise OSError("disk full")
+    monkeypatch.setattr(config.os, 'fsync', failing_fsync)
+    cfg = config.load_config()
+    cfg["openai"]["model"] = "gpt-5"
+    
+    with pytest.raises(ValueError, match="disk full"):
+        config.save_config(cfg)
+    
+    assert config_file.read_bytes() == before
+    assert not config_file.with_name(config_file.name + ".tmp").exists()
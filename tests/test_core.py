@@ -0,0 +1,177 @@
+"""
+Tests for the git and API plumbing in core
+"""
+
+import copy
+import subprocess
+import pytest
+from types import SimpleNamespace
+from ez_commit import config, core
+from ez_commit.commands import CommitHandler
+from ez_commit.exceptions import GitError
+
+def git(*args, cwd):
+    """Run git in the test repository, failing the test if it fails."""
+    return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True)
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """An empty repository as the working directory, with core's caches cleared."""
+    git('init', '-q', cwd=tmp_path)
+    git('config', 'user.name', 'Test', cwd=tmp_path)
+    git('config', 'user.email', 'test@example.com', cwd=tmp_path)
+    monkeypatch.chdir(tmp_path)
+    core.reset_repo()
+    yield tmp_path
+    core.reset_repo()
+
+def test_truncated_diff_fits_and_lists_every_file(repo):
+    lines = [f"zß€ line {n}" for n in range(100)]
+    for i in range(50):
+        (repo / f"file{i:02d}.txt").write_text("\n".join(lines) + "\n", encoding='utf-8')
+    git('add', '--all', cwd=repo)
+    
+    diff, staged = core.get_git_diff(max_bytes=4000)
+    
+    assert staged is True
+    assert len(diff.encode('utf-8')) <= 4000
+    assert diff.endswith("\n[diff truncated]")
+    assert all(f"file{i:02d}.txt" in diff for i in range(50))
+    # Cut on line boundaries, so neither lines nor characters are split
+    added = [line[1:] for line in diff.splitlines()
+             if line.startswith("+") and not line.startswith("+++")]
+    assert added and all(line in lines for line in added)
+
+class FakeStream:
+    """A completion stream yielding one chunk per piece of text."""
+    def __init__(self, texts):
+        self._chunks = iter(
+            SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=text))])
+            for text in texts
+        )
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def requests(monkeypatch):
+    """Answer API requests with "Add feature", recording each request's arguments."""
+    sent = []
+    def create(**kwargs):
+        sent.append(kwargs)
+        return FakeStream(["Add ", "feature"])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    cfg = copy.deepcopy(config.DEFAULT_CONFIG)
+    monkeypatch.setattr(core, '_settings', lambda: (cfg, "test-key"))
+    monkeypatch.setattr(core, 'get_openai_client', lambda api_key=None: client)
+    return sent
+
+def test_request_sends_diff_as_string_content(requests):
+    assert "".join(core.stream_commit_message("test diff")) == "Add feature"
+    
+    (request,) = requests
+    assert request["messages"] == [
+        {"role": "system", "content": config.DEFAULT_SYSTEM_PROMPT},
+        {"role": "user", "content": "Generate a commit message for the following git diff:\n\ntest diff"},
+    ]
+
+def test_request_sends_fresh_idempotency_key(requests):
+    "".join(core.stream_commit_message("test diff"))
+    "".join(core.stream_commit_message("test diff"))
+    
+    first, second = (request["extra_headers"]["Idempotency-Key"] for request in requests)
+    assert first.startswith("ez-commit-")
+    assert second.startswith("ez-commit-")
+    assert first != second
+
+def test_failing_hook_aborts_commit(repo):
+    hook = repo / ".git" / "hooks" / "pre-commit"
+    hook.write_text("#!/bin/sh\necho 'hook rejected the commit' >&2\nexit 1\n")
+    hook.chmod(0o755)
+    (repo / "file.txt").write_text("content\n")
+    handler = CommitHandler(None, core, None)
+    handler._message = "Add file"
+    handler._was_staged = False
+    
+    with pytest.raises(GitError, match="hook rejected the commit"):
+        handler.handle_save()
+    
+    assert git('rev-list', '--all', cwd=repo).stdout == ""
+
+def test_repo_lookup_cached_per_directory(repo, monkeypatch):
+    lookups = []
+    run = subprocess.run
+    def counting_run(args, **kwargs):
+        lookups.append(args)
+        return run(args, **kwargs)
+    monkeypatch.setattr(core.subprocess, 'run', counting_run)
+    (repo / "sub").mkdir()
+    
+    top = core._get_repo()
+    assert core._get_git_dir() == str(repo / ".git")
+    monkeypatch.chdir(repo / "sub")
+    assert core._get_repo() == top
+    monkeypatch.chdir(repo)
+    core._get_repo()
+    
+    # Once for each directory, however often it is asked
+    assert len(lookups) == 2
+    core.reset_repo()
+    core._get_repo()
+    assert len(lookups) == 3
+
+@pytest.fixture
+def unstaged(repo):
+    """A committed file with an unstaged change, and the blob id of the change."""
+    (repo / "file.txt").write_text("old\n")
+    git('add', 'file.txt', cwd=repo)
+    git('commit', '-q', '-m', 'Add file', cwd=repo)
+    (repo / "file.txt").write_text("new\n")
+    return git('hash-object', 'file.txt', cwd=repo).stdout.strip()
+
+def scratch_files(repo):
+    return [p.name for p in (repo / ".git").iterdir() if p.name.startswith("ez-commit-index")]
+
+def test_prestage_writes_objects_only(repo, unstaged):
+    core.finish_prestage(core.prestage_changes())
+    
+    git('cat-file', '-e', unstaged, cwd=repo)
+    assert git('status', '--porcelain', cwd=repo).stdout == " M file.txt\n"
+    assert scratch_files(repo) == []
+
+def test_prestage_cancel_removes_scratch_index(repo, unstaged):
+    core.finish_prestage(core.prestage_changes(), cancel=True)
+    
+    assert git('status', '--porcelain', cwd=repo).stdout == " M file.txt\n"
+    assert scratch_files(repo) == []
+
+def test_prestage_interrupted_removes_scratch_index(repo, unstaged):
+    proc = core.prestage_changes()
+    wait = proc.wait
+    def interrupted_wait(*args, **kwargs):
+        proc.wait = wait
+        raise KeyboardInterrupt
+    proc.wait = interrupted_wait
+    
+    with pytest.raises(KeyboardInterrupt):
+        core.finish_prestage(proc)
+    
+    assert proc.returncode is not None
+    assert scratch_files(repo) == []
+
+def test_prestage_start_failure_removes_scratch_index(repo, unstaged, monkeypatch):
+    def failing_popen(*args, **kwargs):
+        raise OSError("no git")
+    # subprocess.run goes through Popen too, so look the repository up first
+    core._get_repo()
+    monkeypatch.setattr(core.subprocess, 'Popen', failing_popen)
+    
+    assert core.prestage_changes() is None
+    assert scratch_files(repo) == []